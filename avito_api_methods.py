@@ -1,6 +1,7 @@
 import aiohttp
 import json
 import logging
+import re
 from typing import Final, List, Dict, Any
 from asgiref.sync import sync_to_async
 from tgbot.models import EndedChats
@@ -8,16 +9,30 @@ from interface.settings import (
     AVITO_KEY, AVITO_SECRET, AVITO_ID
 )
 
+from tgbot.windows.metrics import API_ERRORS, API_LATENCY, timed
+
 
 logger = logging.getLogger(__name__)
 
+# шаблон для приведения адреса к эндпоинту без id
+ENDPOINT_PATTERN = re.compile(r'/(accounts|chats)/[^/]+')
+
+
+def endpoint_label(url: str) -> str:
+    """Функция получает эндпоинт api для меток метрик."""
+    path = url[len(AvitoApi.base_url):]
+    return ENDPOINT_PATTERN.sub(r'/\1/{id}', path)
+
 
 class AvitoApi:
     """Класс с методами api Авито."""
+    # адрес api, переопределяется для локальных бенчмарков
+    base_url = 'https://api.avito.ru'
+
     @staticmethod
     async def get_access_token():
         """Метод получает временный токен авторизации."""
-        url = 'https://api.avito.ru/token'
+        url = f'{AvitoApi.base_url}/token'
 
         params = {
             'client_id': AVITO_KEY,
@@ -25,10 +40,11 @@ class AvitoApi:
             'grant_type': 'client_credentials',
         }
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, params=params) \
-                    as response:
-                data = await response.json()
+        with timed(API_LATENCY, market='avito', endpoint='/token'):
+            async with aiohttp.ClientSession() as session:
+                async with session.post(url, params=params) \
+                        as response:
+                    data = await response.json()
 
         token = data.get('access_token')
 
@@ -40,6 +56,9 @@ class AvitoApi:
     @staticmethod
     async def make_request(method, url, **kwargs):
         """Метод составляет get/post запрос к api."""
+        headers = await AvitoApi.get_access_token()
+        endpoint = endpoint_label(url)
+
         async with aiohttp.ClientSession() as session:
             # словарь методов
             req_methods = {
@@ -47,14 +66,20 @@ class AvitoApi:
                 'post': session.post
             }
 
-            async with req_methods[method](
-                    url,
-                    headers=await AvitoApi.get_access_token(),
-                    **kwargs
-                ) \
-                    as response:
-                data = await response.json()
-                code = response.status
+            with timed(API_LATENCY, market='avito', endpoint=endpoint):
+                async with req_methods[method](
+                        url,
+                        headers=headers,
+                        **kwargs
+                    ) \
+                        as response:
+                    data = await response.json()
+                    code = response.status
+
+            if code >= 400:
+                API_ERRORS.inc(
+                    market='avito', endpoint=endpoint, status=code
+                )
 
             return data, code
 
@@ -78,11 +103,13 @@ class AvitoApi:
         )
         ended_chats = [chat.chat_id for chat in ended_chats_obj]
 
-        # получаем тайтлы, исключая завершенные диалоги
+        # получаем тайтлы и время последнего обновления,
+        # исключая завершенные диалоги
         titles = [
             (
                 title['id'],
-                title['context']['value']['title']
+                title['context']['value']['title'],
+                title.get('updated')
             ) for title in chats.get('chats')
             if title['id'] not in ended_chats
         ]
@@ -93,7 +120,7 @@ class AvitoApi:
     async def get_all_messages(chat_id):
         """Метод получает все сообщения по chat_id."""
         url = (
-            'https://api.avito.ru/messenger/v3/accounts/'
+            f'{AvitoApi.base_url}/messenger/v3/accounts/'
             f'{AVITO_ID}/chats/{chat_id}/messages/'
         )
 
@@ -129,7 +156,7 @@ class AvitoApi:
     async def get_offer_link(chat_id):
         """Метод получает ссылку на объявление."""
         url = (
-            'https://api.avito.ru/messenger/v2/accounts/'
+            f'{AvitoApi.base_url}/messenger/v2/accounts/'
             f'{AVITO_ID}/chats/{chat_id}'
         )
 
@@ -144,7 +171,7 @@ class AvitoApi:
     async def send_api_message(chat_id, message):
         """Метод, отправляющий пользователю сообщение."""
         url = (
-            'https://api.avito.ru/messenger/v1/accounts/'
+            f'{AvitoApi.base_url}/messenger/v1/accounts/'
             f'{AVITO_ID}/chats/{chat_id}/messages'
         )
 
@@ -172,7 +199,7 @@ class AvitoApi:
     async def mark_as_read_dialog(chat_id):
         """Метод, завершающий диалог."""
         url = (
-            'https://api.avito.ru/messenger/v1/accounts/'
+            f'{AvitoApi.base_url}/messenger/v1/accounts/'
             f'{AVITO_ID}/chats/{chat_id}/read'
         )
 
@@ -194,7 +221,10 @@ class AvitoApi:
     @staticmethod
     async def get_chats(unread=None) -> dict:
         """Метод получает список всех чатов."""
-        url = f'https://api.avito.ru/messenger/v2/accounts/{AVITO_ID}/chats'
+        url = (
+            f'{AvitoApi.base_url}/messenger/v2/accounts/'
+            f'{AVITO_ID}/chats'
+        )
 
         # добавляем параметр если он передан
         params = {}
@@ -213,7 +243,7 @@ class AvitoApi:
     async def get_chat_title(chat_id):
         """Метод получает title чата."""
         url = (
-            'https://api.avito.ru/messenger/v2/accounts/'
+            f'{AvitoApi.base_url}/messenger/v2/accounts/'
             f'{AVITO_ID}/chats/{chat_id}'
         )
 
@@ -228,11 +258,13 @@ class AvitoApi:
     async def data_for_notification():
         """Данные для показа уведомления."""
         last_chat = await AvitoApi.get_chats()
-        chatId = last_chat.get("chats")[0].get("id")
+        chat = last_chat.get("chats")[0]
+        chatId = chat.get("id")
         offer_link = await AvitoApi.get_offer_link(chatId)
         messages = await AvitoApi.get_all_messages(chatId)
 
-        return chatId, offer_link, messages
+        # время обновления чата для выбора уведомления в общем режиме
+        return chatId, offer_link, messages, chat.get("updated")
 
 
 # инициализация экземпляра для вызова методов
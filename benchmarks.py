@@ -0,0 +1,417 @@
+import argparse
+import asyncio
+import itertools
+import os
+import sqlite3
+import statistics
+import tracemalloc
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from random import Random
+from time import perf_counter
+from typing import Any, Awaitable, Callable, List, Tuple
+
+from .fake_servers import FakeServer, FakeServerConfig
+
+
+# запрос к локальной БД, повторяющий выборку prescription: шаблон
+# отчета написан под схему рабочей БД mysql
+REPORT_QUERY = (
+    "SELECT block_id, building_id, address, area_max, rate, "
+    "resp_id, resp_name, owner_id, updated_at "
+    "FROM blocks WHERE area_max * rate > {money_gt}"
+)
+# таблица снимка отчета, чтобы не перезаписать снимок рабочего отчета
+REPORT_TABLE = "rent_benchmark"
+
+
+@dataclass
+class BenchResult:
+    """Результат одного бенчмарка."""
+    name: str
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+    wall: float = 0.0
+
+    def percentile(self, q: int) -> float:
+        """Метод возвращает перцентиль задержки в мс."""
+        if len(self.latencies) < 2:
+            return sum(self.latencies) * 1000
+        return statistics.quantiles(self.latencies, n=100)[q - 1] * 1000
+
+    def render(self) -> str:
+        """Метод формирует строку отчета."""
+        count = len(self.latencies) + self.errors
+        throughput = count / self.wall if self.wall else 0
+        return (
+            f"{self.name:<22} n={count:<5} err={self.errors:<4} "
+            f"p50={self.percentile(50):8.1f}ms "
+            f"p95={self.percentile(95):8.1f}ms "
+            f"thr={throughput:8.1f}/s"
+        )
+
+
+async def measure(
+    name: str, call: Callable[[], Awaitable[Any]],
+    iterations: int, concurrency: int
+) -> BenchResult:
+    """Функция замеряет задержку вызовов при заданной конкурентности."""
+    result = BenchResult(name)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            start = perf_counter()
+            try:
+                await call()
+            except Exception:
+                result.errors += 1
+            else:
+                result.latencies.append(perf_counter() - start)
+
+    start = perf_counter()
+    await asyncio.gather(*[one() for _ in range(iterations)])
+    result.wall = perf_counter() - start
+
+    return result
+
+
+def measure_sync(
+    name: str, call: Callable[[], Any], iterations: int
+) -> BenchResult:
+    """Функция замеряет задержку синхронных вызовов."""
+    result = BenchResult(name)
+    start = perf_counter()
+    for _ in range(iterations):
+        call_start = perf_counter()
+        try:
+            call()
+        except Exception:
+            result.errors += 1
+        else:
+            result.latencies.append(perf_counter() - call_start)
+    result.wall = perf_counter() - start
+
+    return result
+
+
+async def bench_windows(base_url: str, args) -> List[BenchResult]:
+    """Api Авито, окна бота и объединение одинаковых запросов."""
+    from tgbot.windows.avito_api_methods import (
+        AVITO_API_METHODS, AvitoApi
+    )
+    from tgbot.windows.metrics import CACHE_HITS
+    from .dialog_methods_utils import get_method_result
+
+    AvitoApi.base_url = base_url
+
+    # одинаковые одновременные вызовы get_method_result объединяются,
+    # поэтому замеры api и окон вызывают разные чаты
+    chat_ids = (f"chat-{i}" for i in itertools.count())
+
+    async def count_unread():
+        return await AVITO_API_METHODS.count_unread()
+
+    async def get_all_messages():
+        return await AVITO_API_METHODS.get_all_messages(next(chat_ids))
+
+    async def chat_open():
+        chat_id = next(chat_ids)
+        await get_method_result("avito", "get_all_messages", chat_id)
+        await get_method_result("avito", "get_offer_link", chat_id)
+
+    # главное меню у всех операторов одинаковое: замер показывает
+    # выигрыш от объединения запросов, а не скорость api
+    async def main_menu():
+        return await get_method_result("avito", "count_unread")
+
+    results = [
+        await measure(
+            "avito.count_unread", count_unread,
+            args.iterations, args.concurrency
+        ),
+        await measure(
+            "avito.get_all_messages", get_all_messages,
+            args.iterations, args.concurrency
+        ),
+        await measure(
+            "window.chat_open", chat_open,
+            args.iterations, args.concurrency
+        ),
+        await measure(
+            "merged.main_menu", main_menu,
+            args.iterations, args.concurrency
+        ),
+    ]
+    joined = CACHE_HITS.values.get(('single_flight',), 0)
+    print(f"merged.main_menu       joined={joined:.0f}")
+
+    return results
+
+
+async def bench_cadastre(base_url: str, args) -> List[BenchResult]:
+    """Поиск кадастровых номеров и стандартизация адреса."""
+    from .parsing_cadastr import CadastreNumbers
+
+    def make_parser():
+        parser = CadastreNumbers(
+            'Москва, Тверская 1', square='105.5', floor='6'
+        )
+        parser.url = f'{base_url}/searchcad'
+        parser.details_url = f'{base_url}/searchcaddetails'
+        parser.dadata_url = f'{base_url}/api/v1/clean/address'
+        parser.ip_list = []
+        parser.request_delay = (0, 0)
+        return parser
+
+    async def clean_address():
+        return await make_parser().clean_address()
+
+    async def process_numbers():
+        return await make_parser().process_numbers()
+
+    # каждый поиск сам выполняет запросы параллельно,
+    # поэтому поиски идут по одному
+    iterations = max(1, args.iterations // 10)
+    return [
+        await measure(
+            "cadastre.clean_address", clean_address,
+            args.iterations, args.concurrency
+        ),
+        await measure(
+            "cadastre.process_numbers", process_numbers,
+            iterations, 1
+        ),
+    ]
+
+
+class SQLiteCursor:
+    """Курсор sqlite с интерфейсом курсора mysql-connector."""
+
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        self.cursor = connection.cursor()
+
+    def __enter__(self) -> 'SQLiteCursor':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.cursor.close()
+
+    def execute(self, query: str) -> None:
+        """Метод выполняет запрос."""
+        self.cursor.execute(query)
+
+    def fetchall(self) -> List[Tuple[Any, ...]]:
+        """Метод возвращает все строки выборки."""
+        return self.cursor.fetchall()
+
+
+class SQLiteConnection:
+    """Соединение sqlite с интерфейсом mysql-connector."""
+
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        self.connection = connection
+
+    def __enter__(self) -> 'SQLiteConnection':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        # локальная БД переиспользуется между запусками отчета
+        pass
+
+    def cursor(self, buffered: bool = False) -> SQLiteCursor:
+        """Метод открывает курсор."""
+        return SQLiteCursor(self.connection)
+
+
+class AsyncSQLiteCursor:
+    """Курсор sqlite с интерфейсом mysql.connector.aio."""
+
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        self.cursor = connection.cursor()
+
+    async def __aenter__(self) -> 'AsyncSQLiteCursor':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.cursor.close()
+
+    async def execute(self, query: str) -> None:
+        """Метод выполняет запрос в потоке."""
+        await asyncio.to_thread(self.cursor.execute, query)
+
+    async def fetchall(self) -> List[Tuple[Any, ...]]:
+        """Метод возвращает все строки выборки."""
+        return await asyncio.to_thread(self.cursor.fetchall)
+
+
+class AsyncSQLiteConnection(SQLiteConnection):
+    """Соединение sqlite с интерфейсом mysql.connector.aio."""
+
+    async def __aenter__(self) -> 'AsyncSQLiteConnection':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        pass
+
+    async def cursor(self, buffered: bool = False) -> AsyncSQLiteCursor:
+        """Метод открывает курсор."""
+        return AsyncSQLiteCursor(self.connection)
+
+
+class StubAddToDb:
+    """Заглушка AddToDb: строки собираются, но не сохраняются."""
+
+    def __init__(self, model_class: Any, **fields) -> None:
+        self.model_class = model_class
+        self.fields = fields
+
+    def add_to_db(self, market: str = None) -> None:
+        """Метод ничего не сохраняет."""
+
+
+def seed_database(rows: int, seed: int) -> sqlite3.Connection:
+    """Функция создает локальную БД блоков для отчетов."""
+    # запросы асинхронного отчета выполняются в потоках
+    connection = sqlite3.connect(
+        ':memory:', detect_types=sqlite3.PARSE_DECLTYPES,
+        check_same_thread=False
+    )
+    connection.execute(
+        "CREATE TABLE blocks ("
+        "block_id INTEGER, building_id INTEGER, address TEXT, "
+        "area_max REAL, rate REAL, resp_id INTEGER, resp_name TEXT, "
+        "owner_id INTEGER, updated_at TIMESTAMP)"
+    )
+    rnd = Random(seed)
+    now = datetime.now()
+    connection.executemany(
+        "INSERT INTO blocks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [
+            (
+                i, i // 10, f'Москва, улица {i // 10}',
+                rnd.uniform(50, 2000), rnd.uniform(10000, 60000),
+                i % 25, f'Сотрудник {i % 25}',
+                rnd.choice([None, 35, i % 100]),
+                now - timedelta(days=rnd.randint(0, 120)),
+            )
+            for i in range(rows)
+        ]
+    )
+    return connection
+
+
+def render_report_phases(task: str) -> List[str]:
+    """Функция выводит среднюю длительность этапов отчета."""
+    from tgbot.windows.metrics import REPORT_LATENCY
+
+    lines = []
+    for (phase_task, phase), (_, total, count) in sorted(
+        REPORT_LATENCY.values.items()
+    ):
+        if phase_task == task and count:
+            lines.append(
+                f"{'report.' + phase:<22} n={count:<5} "
+                f"mean={total / count * 1000:8.1f}ms"
+            )
+    return lines
+
+
+async def bench_reports(args) -> List[BenchResult]:
+    """Отчет prescription: полный запуск синхронно и асинхронно."""
+    from actualising_report.report_classes import Reports
+
+    connection = seed_database(args.rows, args.seed)
+
+    # запуск проходит через Reports целиком: запрос через драйвер,
+    # преобразование, запись заглушкой AddToDb и снимок
+    report = Reports(
+        "prescription", model_class=None,
+        table_name=REPORT_TABLE, table_param="rent"
+    )
+    query = REPORT_QUERY.format(money_gt=report.money_gt)
+    report.get_sql_query = lambda: query
+    report.get_connection = lambda: SQLiteConnection(connection)
+
+    async def aget_connection():
+        return AsyncSQLiteConnection(connection)
+
+    report.aget_connection = aget_connection
+    report.get_adder_class = lambda: StubAddToDb
+
+    iterations = max(1, args.iterations // 10)
+    results = [
+        await asyncio.to_thread(
+            measure_sync, "report.run", report.add_to_db, iterations
+        ),
+        # отчеты запускаются по одному
+        await measure("report.arun", report.aadd_to_db, iterations, 1),
+    ]
+    for line in render_report_phases(report.task):
+        print(line)
+
+    # пиковая память строк отчета
+    rows = connection.execute(query).fetchall()
+    tracemalloc.start()
+    data = report.build_rows(rows)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(
+        f"report.rows_memory      rows={len(data)} "
+        f"peak={peak / 1024 / 1024:.1f}MB"
+    )
+
+    return results
+
+
+async def run(args) -> None:
+    """Функция запускает локальный сервер и все бенчмарки."""
+    server = FakeServer(FakeServerConfig(
+        latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, rate_limit=args.rate_limit,
+        seed=args.seed
+    ))
+    base_url = await server.start()
+    try:
+        results = []
+        if "windows" in args.suites:
+            results += await bench_windows(base_url, args)
+        if "cadastre" in args.suites:
+            results += await bench_cadastre(base_url, args)
+        if "reports" in args.suites:
+            results += await bench_reports(args)
+    finally:
+        await server.stop()
+
+    for result in results:
+        print(result.render())
+
+
+def main() -> None:
+    """Точка входа: python -m <пакет>.benchmarks."""
+    parser = argparse.ArgumentParser(description="Локальные бенчмарки")
+    parser.add_argument(
+        "--suites", nargs="+",
+        default=["windows", "cadastre", "reports"],
+        choices=["windows", "cadastre", "reports"]
+    )
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=int, default=None)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    # модели и кэш бота требуют настроенного django
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "interface.settings")
+    import django
+    django.setup()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -14,7 +14,11 @@ from tgbot.windows.states.all_states import (
 import tgbot.templates.text_templates as tp
 from tgbot.config.use_case import CORE_USE_CASE
 
-from .dialog_methods_utils import get_method_result
+from .dialog_methods_utils import (
+    ALL_MARKETS, get_method_result, get_all_markets_result,
+    merge_dialogs, pick_latest_notification, resolve_chat
+)
+from .dialog_prefetch import CHAT_PREFETCHER
 
 
 async def switch_to_main_menu(
@@ -22,6 +26,7 @@ async def switch_to_main_menu(
     manager: DialogManager
 ):
     """Проверка пользователя и начало соответствующего диалога."""
+    CHAT_PREFETCHER.cancel(msg.from_user.id)
 
     group = await CORE_USE_CASE.get_user_group(
         username=msg.from_user.username
@@ -44,19 +49,35 @@ async def on_market_selected(
     dialog_manager: DialogManager,
 ):
     """Выбор площадки для чата."""
-    # устнавливаем площадку
+    CHAT_PREFETCHER.cancel(callback.from_user.id)
+    # устнавливаем площадку, all - общий режим по всем площадкам
     dialog_manager.dialog_data['market'] = callback.data.split('_')[0]
+    dialog_manager.dialog_data.pop('chat_market', None)
     await dialog_manager.switch_to(MarketingStates.main_menu)
 
 
 async def main_menu_window_data(dialog_manager: DialogManager, **kwargs):
     """getter главного меню с обработкой ошибочного статуса."""
     market = dialog_manager.dialog_data.get('market')
+    failed = []
 
     # получаем данные
-    acquired_data = await get_method_result(
-        market, "count_unread"
-    )
+    if market == ALL_MARKETS:
+        counts, failed = await get_all_markets_result("count_unread")
+        # если int, значит статус 200
+        failed += [
+            key for key, count in counts.items()
+            if not isinstance(count, int)
+        ]
+        counts = [
+            count for count in counts.values()
+            if isinstance(count, int)
+        ]
+        acquired_data = sum(counts) if counts else None
+    else:
+        acquired_data = await get_method_result(
+            market, "count_unread"
+        )
 
     # если int, значит статус 200
     condition = isinstance(acquired_data, int)
@@ -64,7 +85,9 @@ async def main_menu_window_data(dialog_manager: DialogManager, **kwargs):
     return {
         "unread_count": f"({acquired_data})" if condition else "(0)",
         "success": True if condition else False,
-        "failure": True if not condition else False
+        "failure": True if not condition else False,
+        "partial": True if condition and failed else False,
+        "failed_markets": ", ".join(failed)
     }
 
 
@@ -72,24 +95,54 @@ async def dialogs_window_data(dialog_manager: DialogManager, **kwargs):
     """Данные для вывода кнопок непрочитанных диалогов."""
     dialog_type = dialog_manager.event.data.split("_")[1]
 
+    market = dialog_manager.dialog_data.get('market')
+
+    unread = True if dialog_type == "unread" else None
+    failed = []
+
     # получаем диалоги
-    dialogs = await get_method_result(
-        dialog_manager.dialog_data.get('market'),
-        "get_dialogs_list",
-        True if dialog_type == "unread" else None
-    )
+    if market == ALL_MARKETS:
+        dialogs_by_market, failed = await get_all_markets_result(
+            "get_dialogs_list", unread
+        )
+        dialogs = merge_dialogs(dialogs_by_market)
+    else:
+        dialogs = await get_method_result(
+            market,
+            "get_dialogs_list",
+            unread
+        )
+
+    # в фоне подгружаем первые чаты, которые скорее всего откроют
+    if dialogs:
+        CHAT_PREFETCHER.start(
+            dialog_manager.event.from_user.id,
+            [resolve_chat(market, dialog[0]) for dialog in dialogs]
+        )
 
     return {
-        "dialogs": dialogs
+        "dialogs": dialogs,
+        "partial": True if failed else False,
+        "failed_markets": ", ".join(failed)
     }
 
 
+def get_chat_market(manager: DialogManager) -> str:
+    """Площадка открытого диалога с учетом общего режима."""
+    return manager.dialog_data.get(
+        'chat_market', manager.dialog_data.get('market')
+    )
+
+
 async def on_chat_selected(
     callback: CallbackQuery, widget: Any,
     manager: DialogManager, item_id: str
 ):
     """on_click функция для перехода в диалог."""
     market = manager.dialog_data.get("market")
+    # остальные подгрузки больше не нужны, выбранный чат
+    # берется из готовых результатов
+    CHAT_PREFETCHER.cancel(callback.from_user.id)
 
     state_id = callback.data.split(':')[0]
     state = {
@@ -97,22 +150,38 @@ async def on_chat_selected(
         's_read_dialog': MarketingStates.select_read
     }
 
+    # в общем режиме площадка определяется по выбранному диалогу
+    chat_market, chat_id = resolve_chat(market, item_id)
+
     # получаем диалог по его chat_id
-    messages = await get_method_result(
-        market,
+    prefetched = CHAT_PREFETCHER.is_fresh(
+        (chat_market, "get_all_messages", chat_id)
+    )
+    messages = await CHAT_PREFETCHER.get_result(
+        chat_market,
         "get_all_messages",
-        item_id
+        chat_id
     )
     # передаем сообщения для рендера
     manager.dialog_data['messages'] = messages
-    manager.dialog_data['chatId'] = item_id
+    manager.dialog_data['chatId'] = chat_id
+    manager.dialog_data['chat_market'] = chat_market
     if messages:
-        manager.dialog_data['offer_link'] = await get_method_result(
-            market, "get_offer_link", item_id
+        offer_link = await CHAT_PREFETCHER.get_result(
+            chat_market, "get_offer_link", chat_id
         )
+        manager.dialog_data['offer_link'] = offer_link
         manager.dialog_data['dialog_messages'] = messages
         await manager.switch_to(state[state_id])
 
+        # подгруженные сообщения могли устареть, поэтому окно
+        # обновляется свежими сразу после показа
+        if prefetched:
+            CHAT_PREFETCHER.refresh_messages(
+                callback.from_user.id, manager.bg(),
+                chat_market, chat_id
+            )
+
 
 async def on_chat_selected_getter(
     dialog_manager: DialogManager, **kwargs
@@ -142,7 +211,7 @@ async def send_message(
     chat_id = manager.dialog_data['chatId']
     # вызываем метод отправки сообщения
     await get_method_result(
-        manager.dialog_data.get("market"),
+        get_chat_market(manager),
         "send_api_message",
         chat_id,
         msg.text
@@ -160,7 +229,7 @@ async def send_message_template(
     chat_id = manager.dialog_data['chatId']
     template_dict = {
         "greeting_answer": tp.template_greeting(
-            manager.dialog_data.get('market')
+            get_chat_market(manager)
         ),
         "delegate_answer": tp.template_delegate,
         "template_greeting_1": tp.template_greeting_1,
@@ -169,7 +238,7 @@ async def send_message_template(
     text_answer = template_dict.get(callback.data, "")
     # вызываем метод отправки сообщения
     await get_method_result(
-        manager.dialog_data.get('market'),
+        get_chat_market(manager),
         "send_api_message",
         chat_id,
         text_answer
@@ -186,7 +255,7 @@ async def finisih_dialog(
     chat_id = manager.dialog_data['chatId']
     # вызываем метод отправки сообщения
     await get_method_result(
-        manager.dialog_data.get('market'),
+        get_chat_market(manager),
         "mark_as_read_dialog",
         chat_id
     )
@@ -198,14 +267,34 @@ async def notification_getter(dialog_manager: DialogManager, **kwargs) -> dict:
     # получаем market
     market = dialog_manager.start_data
 
+    chat_market = market
+    failed = []
+
     # вызываем метод отправки сообщения
-    chatId, offer_link, messages = await get_method_result(
-        market,
-        "data_for_notification",
-    )
+    if market == ALL_MARKETS:
+        notifications, failed = await get_all_markets_result(
+            "data_for_notification"
+        )
+        # если tuple, значит площадка ответила
+        failed += [
+            key for key, notification in notifications.items()
+            if not isinstance(notification, tuple)
+        ]
+        # берем последнее обновленное полное уведомление
+        latest = pick_latest_notification(notifications)
+        chat_market, notification = latest or (market, (None, None, None))
+    else:
+        notification = await get_method_result(
+            market,
+            "data_for_notification",
+        )
+
+    # площадка может добавить время обновления чата
+    chatId, offer_link, messages = notification[:3]
 
     # объявляем market для остальных функций
     dialog_manager.dialog_data['market'] = market
+    dialog_manager.dialog_data['chat_market'] = chat_market
     dialog_manager.dialog_data['chatId'] = chatId
 
     condition = chatId and offer_link and messages
@@ -214,5 +303,7 @@ async def notification_getter(dialog_manager: DialogManager, **kwargs) -> dict:
         "dialog_messages": messages,
         "offer_link": offer_link,
         "success": True if condition else False,
-        "failure": True if not condition else False
+        "failure": True if not condition else False,
+        "partial": True if failed else False,
+        "failed_markets": ", ".join(failed)
     }
@@ -1,27 +1,274 @@
-from typing import Dict, Any
-from tgbot.windows.cian_api_methods import CIAN_API_METHODS
-from tgbot.windows.avito_api_methods import AVITO_API_METHODS
+import asyncio
+import logging
+from collections import deque
+from contextlib import contextmanager
+from importlib import import_module
+from itertools import chain, zip_longest
+from time import monotonic
+from typing import (
+    Deque, Dict, Any, Callable, FrozenSet,
+    Hashable, Iterator, List, Optional, Tuple
+)
 
+from tgbot.windows.metrics import CACHE_HITS, METHOD_LATENCY, timed
 
-# ключ cian/avito, значение: соответствующий экземляр
+
+logger = logging.getLogger(__name__)
+
+# ключ cian/avito, значение: путь к соответствующему экземляру,
+# модуль площадки импортируется при первом обращении к ней
 api_attrs_dict: Dict[str, Dict[str, Any]] = {
     "cian": {
-        "class": CIAN_API_METHODS,
+        "class": "tgbot.windows.cian_api_methods:CIAN_API_METHODS",
     },
     "avito": {
-        "class": AVITO_API_METHODS,
+        "class": "tgbot.windows.avito_api_methods:AVITO_API_METHODS",
     }
 }
 
+# режим общего окна по всем площадкам
+ALL_MARKETS = "all"
+# разделитель площадки и chat_id в общем списке диалогов
+MARKET_SEPARATOR = "|"
+# время ожидания ответа одной площадки в общем режиме, сек
+MARKET_TIMEOUT = 10
+
+# бюджет запросов к api одной площадки: фоновые запросы выполняются,
+# только пока за период было меньше BUDGET_LIMIT запросов
+BUDGET_LIMIT = 30
+BUDGET_PERIOD = 60
+
+# методы, изменяющие данные, их вызовы не объединяются
+WRITE_METHODS: FrozenSet[str] = frozenset({
+    "send_api_message",
+    "mark_as_read_dialog",
+})
+
+
+def get_api_methods(instance: Any) -> Dict[str, Callable]:
+    """Функция собирает публичные методы экземпляра площадки."""
+    return {
+        name: getattr(instance, name)
+        for name in dir(instance)
+        if not name.startswith('_')
+        and callable(getattr(instance, name))
+    }
+
+
+# ключ cian/avito, значение: методы площадки, собранные один раз
+# при первом обращении к площадке
+api_methods_dict: Dict[str, Dict[str, Callable]] = {}
+
+
+def get_market_methods(market: str) -> Dict[str, Callable]:
+    """Функция получает методы площадки, импортируя ее при первом вызове."""
+    methods = api_methods_dict.get(market)
+    if methods is None:
+        module_path, attr = api_attrs_dict[market]["class"].split(':')
+        instance = getattr(import_module(module_path), attr)
+        methods = api_methods_dict[market] = get_api_methods(instance)
+    return methods
+
+
+class ApiBudget:
+    """Бюджет запросов к api с приоритетом запросов оператора."""
+
+    def __init__(
+        self, limit: int = BUDGET_LIMIT,
+        period: float = BUDGET_PERIOD
+    ) -> None:
+        self.limit = limit
+        self.period = period
+        # ключ площадка, значение: время запросов за период
+        self.calls: Dict[str, Deque[float]] = {}
+        # количество выполняющихся запросов оператора
+        self.foreground_calls = 0
+        self.idle: Optional[asyncio.Event] = None
+
+    def get_idle(self) -> asyncio.Event:
+        """Метод получает событие отсутствия запросов оператора."""
+        if self.idle is None:
+            self.idle = asyncio.Event()
+            self.idle.set()
+        return self.idle
+
+    def used(self, market: str) -> int:
+        """Метод считает запросы площадки за период."""
+        calls = self.calls.setdefault(market, deque())
+        while calls and monotonic() - calls[0] > self.period:
+            calls.popleft()
+        return len(calls)
+
+    @contextmanager
+    def foreground(self, market: str) -> Iterator[None]:
+        """Запрос оператора: учитывается в бюджете, но не ждет."""
+        self.used(market)
+        self.calls[market].append(monotonic())
+        self.foreground_calls += 1
+        self.get_idle().clear()
+        try:
+            yield
+        finally:
+            self.foreground_calls -= 1
+            if not self.foreground_calls:
+                self.get_idle().set()
+
+    async def acquire_background(self, market: str) -> bool:
+        """Метод ждет окончания запросов оператора и занимает бюджет."""
+        idle = self.get_idle()
+        while self.foreground_calls:
+            await idle.wait()
+
+        # при исчерпанном бюджете фоновый запрос пропускается
+        if self.used(market) >= self.limit:
+            return False
+        self.calls[market].append(monotonic())
+        return True
+
+
+# общий бюджет запросов процесса
+API_BUDGET = ApiBudget()
+
+# выполняющиеся запросы: (площадка, метод, аргументы) -> задача
+in_flight_requests: Dict[Tuple[Hashable, ...], asyncio.Future] = {}
 
-async def get_method_result(market: str, method_name: str, *args) -> Any:
+
+async def get_method_result(
+    market: str, method_name: str, *args,
+    background: bool = False
+) -> Any:
     """Метод вызывает методы из классов по параметрам."""
-    # получаем экземляр класса
-    model_instance = api_attrs_dict.get(market)["class"]
+    with timed(METHOD_LATENCY, market=market, method=method_name):
+        # фоновые запросы занимают бюджет в acquire_background
+        if background:
+            return await call_method(market, method_name, *args)
+        with API_BUDGET.foreground(market):
+            return await call_method(market, method_name, *args)
+
+
+async def call_method(market: str, method_name: str, *args) -> Any:
+    """Метод вызывает метод площадки, объединяя одинаковые запросы."""
+    # получаем метод площадки
+    method = get_market_methods(market)[method_name]
+
+    # запросы на запись всегда выполняются отдельно
+    if method_name in WRITE_METHODS:
+        return await method(*args)
+
+    key = (market, method_name, args)
+    try:
+        task = in_flight_requests.get(key)
+    except TypeError:
+        # нехешируемые аргументы, объединение невозможно
+        return await method(*args)
+
+    # одинаковые запросы ожидают одну задачу
+    if task is None:
+        task = asyncio.ensure_future(method(*args))
+        in_flight_requests[key] = task
+        task.add_done_callback(
+            lambda _: in_flight_requests.pop(key, None)
+        )
+    else:
+        CACHE_HITS.inc(cache='single_flight')
+
+    # shield: отмена одного ожидающего не отменяет запрос для остальных
+    return await asyncio.shield(task)
+
+
+async def get_all_markets_result(
+    method_name: str, *args,
+    timeout: float = MARKET_TIMEOUT
+) -> Tuple[Dict[str, Any], List[str]]:
+    """Метод вызывает метод на всех площадках одновременно."""
+    markets = list(api_attrs_dict)
+
+    # медленная площадка не задерживает остальные дольше timeout
+    results = await asyncio.gather(*[
+        asyncio.wait_for(
+            get_method_result(market, method_name, *args), timeout
+        )
+        for market in markets
+    ], return_exceptions=True)
+
+    acquired_data: Dict[str, Any] = {}
+    failed: List[str] = []
+    for market, result in zip(markets, results):
+        if isinstance(result, BaseException):
+            logger.warning(
+                f"Площадка {market} не ответила на {method_name}: "
+                f"{result!r}"
+            )
+            failed.append(market)
+        else:
+            acquired_data[market] = result
+
+    return acquired_data, failed
+
+
+def tag_chat_id(market: str, chat_id: str) -> str:
+    """Функция добавляет площадку к chat_id для общего списка."""
+    return f"{market}{MARKET_SEPARATOR}{chat_id}"
+
+
+def resolve_chat(market: str, item_id: str) -> Tuple[str, str]:
+    """Функция получает площадку и chat_id выбранного диалога."""
+    if market == ALL_MARKETS:
+        chat_market, chat_id = item_id.split(MARKET_SEPARATOR, 1)
+        return chat_market, chat_id
+    return market, item_id
+
+
+def pick_latest_notification(
+    notifications: Dict[str, Any]
+) -> Optional[Tuple[str, Tuple[Any, ...]]]:
+    """Функция выбирает последнее обновленное полное уведомление."""
+    # уведомление: (chatId, offer_link, messages) и, если площадка
+    # его отдает, время обновления чата
+    complete = [
+        (market, notification)
+        for market, notification in notifications.items()
+        if isinstance(notification, tuple) and all(notification[:3])
+    ]
+    if not complete:
+        return None
+
+    # уведомления без времени обновления считаются самыми старыми
+    return max(
+        complete,
+        key=lambda item: (
+            (True, item[1][3])
+            if len(item[1]) > 3 and item[1][3] is not None
+            else (False, 0)
+        )
+    )
+
+
+def merge_dialogs(
+    dialogs_by_market: Dict[str, Optional[List[Tuple[Any, ...]]]]
+) -> List[Tuple[Any, ...]]:
+    """Функция объединяет диалоги площадок в один список."""
+    # диалог: (chat_id, title) или (chat_id, title, время обновления)
+    tagged = [
+        [
+            (
+                tag_chat_id(market, dialog[0]),
+                f"{market}: {dialog[1]}",
+                *dialog[2:3]
+            )
+            for dialog in dialogs or []
+        ]
+        for market, dialogs in dialogs_by_market.items()
+    ]
+    merged = list(chain.from_iterable(tagged))
 
-    # получаем данные посредством вызова метода
-    acquired_data = await getattr(
-        model_instance, method_name
-    )(*args)
+    # сортируем от новых к старым, если все площадки отдали время
+    if all(len(dialog) > 2 and dialog[2] is not None for dialog in merged):
+        return sorted(merged, key=lambda dialog: dialog[2], reverse=True)
 
-    return acquired_data
+    # иначе площадки отдают диалоги от новых к старым, поэтому
+    # чередуем их, чтобы сверху были последние диалоги каждой площадки
+    return [
+        dialog for dialog in chain.from_iterable(zip_longest(*tagged))
+        if dialog is not None
+    ]
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+from time import monotonic
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+
+from .dialog_methods_utils import API_BUDGET, get_method_result
+from tgbot.windows.metrics import CACHE_HITS
+
+
+logger = logging.getLogger(__name__)
+
+# ключ метод, который прогревается для открытия чата, значение: сколько
+# секунд результат считается актуальным; показанные из подгрузки
+# сообщения обновляются в фоне через refresh_messages
+PREFETCH_TTLS: Dict[str, float] = {
+    "get_all_messages": 60,
+    "get_offer_link": 600,
+}
+
+
+class ChatPrefetcher:
+    """Класс фоновой подгрузки первых диалогов из списка."""
+
+    def __init__(
+        self, top_n: int = 3,
+        concurrency: int = 2
+    ) -> None:
+        self.top_n = top_n
+        self.concurrency = concurrency
+        # ключ id пользователя, значение: задачи подгрузки
+        self.tasks: Dict[int, Set[asyncio.Task]] = {}
+        # ключ (площадка, метод, аргументы), значение: (время, результат)
+        self.results: Dict[Tuple[Hashable, ...], Tuple[float, Any]] = {}
+        # ключи, которые подгружаются прямо сейчас
+        self.pending: Set[Tuple[Hashable, ...]] = set()
+        self.semaphore: Optional[asyncio.Semaphore] = None
+
+    def is_fresh(self, key: Tuple[Hashable, ...]) -> bool:
+        """Метод проверяет, есть ли актуальный результат по ключу."""
+        cached = self.results.get(key)
+        return bool(cached) and (
+            monotonic() - cached[0] <= PREFETCH_TTLS.get(key[1], 0)
+        )
+
+    def start(
+        self, user_id: int,
+        chats: List[Tuple[str, str]]
+    ) -> None:
+        """Метод запускает подгрузку чатов для пользователя."""
+        self.drop_expired()
+
+        # getter вызывается на каждый рендер окна, поэтому повторно
+        # запрашиваются только ключи без актуального результата
+        keys = [
+            (market, method_name, chat_id)
+            for market, chat_id in chats[:self.top_n]
+            for method_name in PREFETCH_TTLS
+            if (market, method_name, chat_id) not in self.pending
+            and not self.is_fresh((market, method_name, chat_id))
+        ]
+        if not keys:
+            return
+
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+
+        self.pending.update(keys)
+        task = asyncio.create_task(self.prefetch(keys))
+        user_tasks = self.tasks.setdefault(user_id, set())
+        user_tasks.add(task)
+        task.add_done_callback(user_tasks.discard)
+
+    def cancel(self, user_id: int) -> None:
+        """Метод отменяет подгрузку, если пользователь покинул окно."""
+        for task in self.tasks.pop(user_id, set()):
+            task.cancel()
+
+    async def prefetch(self, keys: List[Tuple[str, str, str]]) -> None:
+        """Метод подгружает сообщения и данные первых чатов."""
+        try:
+            await asyncio.gather(*[
+                self.prefetch_one(*key) for key in keys
+            ])
+        finally:
+            self.pending.difference_update(keys)
+
+    async def prefetch_one(
+        self, market: str,
+        method_name: str, chat_id: str
+    ) -> None:
+        """Метод выполняет один запрос подгрузки."""
+        # не больше concurrency фоновых запросов на всех пользователей;
+        # запросы оператора выполняются первыми, а при исчерпанном
+        # бюджете api подгрузка пропускается
+        async with self.semaphore:
+            if not await API_BUDGET.acquire_background(market):
+                logger.debug(
+                    f"Бюджет api {market} исчерпан, {method_name} "
+                    f"для чата {chat_id} не подгружается"
+                )
+                return
+            try:
+                result = await get_method_result(
+                    market, method_name, chat_id, background=True
+                )
+            except Exception as ex:
+                logger.warning(
+                    f"Не удалось подгрузить {method_name} "
+                    f"для чата {chat_id}: {ex}"
+                )
+                return
+
+        self.results[(market, method_name, chat_id)] = (monotonic(), result)
+
+    def drop_expired(self) -> None:
+        """Метод удаляет устаревшие результаты подгрузки."""
+        for key in [
+            key for key in self.results if not self.is_fresh(key)
+        ]:
+            del self.results[key]
+
+    async def get_result(self, market: str, method_name: str, *args) -> Any:
+        """Метод отдает подгруженный результат или выполняет запрос."""
+        key = (market, method_name, *args)
+        if self.is_fresh(key):
+            CACHE_HITS.inc(cache='prefetch')
+            return self.results.pop(key)[1]
+
+        # подгрузка, которая еще выполняется, объединяется с этим
+        # запросом в get_method_result
+        self.results.pop(key, None)
+        return await get_method_result(market, method_name, *args)
+
+    def refresh_messages(
+        self, user_id: int, bg_manager: Any,
+        market: str, chat_id: str
+    ) -> None:
+        """Метод обновляет показанные из подгрузки сообщения чата."""
+        task = asyncio.create_task(
+            self.update_messages(bg_manager, market, chat_id)
+        )
+        user_tasks = self.tasks.setdefault(user_id, set())
+        user_tasks.add(task)
+        task.add_done_callback(user_tasks.discard)
+
+    async def update_messages(
+        self, bg_manager: Any,
+        market: str, chat_id: str
+    ) -> None:
+        """Метод запрашивает свежие сообщения и обновляет окно."""
+        try:
+            messages = await get_method_result(
+                market, "get_all_messages", chat_id
+            )
+        except Exception as ex:
+            logger.warning(
+                f"Не удалось обновить сообщения чата {chat_id}: {ex}"
+            )
+            return
+
+        if messages:
+            await bg_manager.update({
+                'messages': messages,
+                'dialog_messages': messages,
+            })
+
+
+# инициализация экземпляра для подгрузки чатов
+CHAT_PREFETCHER = ChatPrefetcher()
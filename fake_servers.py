@@ -0,0 +1,191 @@
+import asyncio
+import random
+from dataclasses import dataclass
+from time import monotonic, time
+from typing import Optional
+
+from aiohttp import web
+
+
+@dataclass
+class FakeServerConfig:
+    """Параметры локальной замены внешних сервисов."""
+    # задержка ответа и ее разброс, сек
+    latency: float = 0.05
+    jitter: float = 0.01
+    # доля ответов со статусом 500
+    error_rate: float = 0.0
+    # лимит запросов в секунду, сверх лимита отдается 429
+    rate_limit: Optional[int] = None
+    # количество чатов, сообщений в чате и кадастровых номеров
+    chats: int = 20
+    messages: int = 30
+    numbers: int = 15
+    seed: int = 42
+
+
+# шаблон карточки объекта в ответе searchcaddetails
+DETAILS_HTML = (
+    'Этаж: <b>\n\t\t\t\t\t\t{floor} </b>\n\t'
+    'Площадь: <b>\n\t\t\t\t\t\t{square}кв.м'
+)
+SEARCHCAD_HTML = (
+    '<html><head><meta name="csrf-token" content="fake-csrf">'
+    '</head><body></body></html>'
+)
+
+
+class FakeServer:
+    """Локальный сервер с эндпоинтами Авито, кадастра и dadata."""
+
+    def __init__(self, config: FakeServerConfig) -> None:
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.window_start = monotonic()
+        self.window_count = 0
+        self.runner: Optional[web.AppRunner] = None
+        self.base_url: Optional[str] = None
+
+    @web.middleware
+    async def conditions(self, request, handler):
+        """Задержка, ошибки и троттлинг для каждого запроса."""
+        config = self.config
+
+        # окно троттлинга в одну секунду
+        now = monotonic()
+        if now - self.window_start >= 1:
+            self.window_start = now
+            self.window_count = 0
+        self.window_count += 1
+        if config.rate_limit and self.window_count > config.rate_limit:
+            return web.json_response({'error': 'throttled'}, status=429)
+
+        await asyncio.sleep(max(
+            0, config.latency + self.random.uniform(
+                -config.jitter, config.jitter
+            )
+        ))
+
+        if self.random.random() < config.error_rate:
+            return web.json_response({'error': 'fake error'}, status=500)
+
+        return await handler(request)
+
+    def make_app(self) -> web.Application:
+        """Метод собирает приложение с эндпоинтами."""
+        app = web.Application(middlewares=[self.conditions])
+        app.add_routes([
+            web.post('/token', self.token),
+            web.get('/messenger/v2/accounts/{account}/chats', self.chats),
+            web.get(
+                '/messenger/v2/accounts/{account}/chats/{chat_id}',
+                self.chat
+            ),
+            web.get(
+                '/messenger/v3/accounts/{account}/chats/{chat_id}/messages/',
+                self.messages
+            ),
+            web.post(
+                '/messenger/v1/accounts/{account}/chats/{chat_id}/messages',
+                self.ok
+            ),
+            web.post(
+                '/messenger/v1/accounts/{account}/chats/{chat_id}/read',
+                self.ok
+            ),
+            web.get('/searchcad', self.searchcad_page),
+            web.post('/searchcad', self.searchcad),
+            web.post('/searchcaddetails', self.searchcaddetails),
+            web.post('/api/v1/clean/address', self.clean_address),
+        ])
+        return app
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """Метод запускает сервер и возвращает его адрес."""
+        self.runner = web.AppRunner(self.make_app())
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        self.base_url = f'http://{host}:{port}'
+        return self.base_url
+
+    async def stop(self) -> None:
+        """Метод останавливает сервер."""
+        if self.runner:
+            await self.runner.cleanup()
+
+    async def token(self, request):
+        """Временный токен авторизации."""
+        return web.json_response({'access_token': 'fake-token'})
+
+    def chat_context(self, chat_id):
+        """Контекст объявления чата."""
+        return {
+            'value': {
+                'title': f'Объявление {chat_id}',
+                'url': f'https://www.avito.ru/{chat_id}',
+            }
+        }
+
+    async def chats(self, request):
+        """Список чатов от новых к старым."""
+        now = int(time())
+        return web.json_response({'chats': [
+            {
+                'id': f'chat-{i}', 'updated': now - i * 60,
+                'context': self.chat_context(f'chat-{i}')
+            }
+            for i in range(self.config.chats)
+        ]})
+
+    async def chat(self, request):
+        """Данные одного чата."""
+        chat_id = request.match_info['chat_id']
+        return web.json_response({
+            'id': chat_id, 'context': self.chat_context(chat_id)
+        })
+
+    async def messages(self, request):
+        """Сообщения чата."""
+        return web.json_response({'messages': [
+            {
+                'author_id': i % 2,
+                'content': {'text': f'Сообщение {i}'},
+            }
+            for i in range(self.config.messages)
+        ]})
+
+    async def ok(self, request):
+        """Ответ на отправку сообщения и завершение диалога."""
+        return web.json_response({})
+
+    async def searchcad_page(self, request):
+        """Страница поиска с csrf токеном."""
+        response = web.Response(text=SEARCHCAD_HTML, content_type='text/html')
+        response.set_cookie('XSRF-TOKEN', 'fake-cookie')
+        return response
+
+    async def searchcad(self, request):
+        """Кадастровые номера по адресу."""
+        return web.json_response([
+            {'Number': f'77:01:0001001:{i}'}
+            for i in range(self.config.numbers)
+        ])
+
+    async def searchcaddetails(self, request):
+        """Карточка объекта по кадастровому номеру."""
+        data = await request.post()
+        number = int(str(data.get('cadnum', '0')).split(':')[-1] or 0)
+        return web.json_response({'html': DETAILS_HTML.format(
+            floor=number % 10 + 1,
+            square=f'{100 + number},5',
+        )})
+
+    async def clean_address(self, request):
+        """Стандартизация адреса."""
+        addresses = await request.json()
+        return web.json_response([
+            {'source': address, 'result': f'г Москва, {address}'}
+            for address in addresses
+        ])
@@ -0,0 +1,108 @@
+import argparse
+import re
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+
+# модули, время импорта которых проверяется
+PROFILED_MODULES: Tuple[str, ...] = (
+    "tgbot.windows.dialog_methods_utils",
+    "tgbot.windows.parsing_cadastr",
+    "actualising_report.report_classes",
+)
+
+# тяжелые зависимости, которые импортируются только при первом
+# использовании и не должны попадать в импорт модулей выше
+HEAVY_MODULES: Tuple[str, ...] = (
+    "bs4",
+    "cloudscraper",
+    "mysql",
+    "tgbot.windows.avito_api_methods",
+    "tgbot.windows.cian_api_methods",
+)
+
+# строка вывода python -X importtime
+IMPORTTIME_PATTERN = re.compile(
+    r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\| (\s*)(\S+)'
+)
+
+
+def profile_import(module: str) -> Tuple[int, Dict[str, int]]:
+    """Функция замеряет импорт модуля в чистом процессе, мкс."""
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True
+    )
+    if completed.returncode:
+        raise RuntimeError(
+            f"Не удалось импортировать {module}:\n{completed.stderr}"
+        )
+
+    # вывод идет в порядке завершения импорта: зависимости модуля
+    # перечислены перед ним после предыдущего импорта верхнего уровня,
+    # поэтому запуск интерпретатора (site, encodings) не учитывается;
+    # ключ импортированный модуль, значение: собственное время импорта
+    self_times: Dict[str, int] = {}
+    for line in completed.stderr.splitlines():
+        match = IMPORTTIME_PATTERN.match(line)
+        if not match:
+            continue
+        self_time, cumulative, indent, imported = match.groups()
+        self_times[imported] = int(self_time)
+        if not indent:
+            if imported == module:
+                return int(cumulative), self_times
+            self_times = {}
+
+    raise RuntimeError(f"Импорт {module} не найден в выводе importtime")
+
+
+def find_heavy_imports(self_times: Dict[str, int]) -> List[str]:
+    """Функция находит тяжелые зависимости среди импортов модуля."""
+    return sorted(
+        imported for imported in self_times
+        if any(
+            imported == heavy or imported.startswith(heavy + '.')
+            for heavy in HEAVY_MODULES
+        )
+    )
+
+
+def main() -> None:
+    """Точка входа: python -m <пакет>.import_profile."""
+    parser = argparse.ArgumentParser(description="Время импорта модулей")
+    parser.add_argument("--budget-ms", type=float, default=300)
+    parser.add_argument("--top", type=int, default=5)
+    args = parser.parse_args()
+
+    over_budget: List[str] = []
+    for module in PROFILED_MODULES:
+        cumulative, self_times = profile_import(module)
+        total_ms = cumulative / 1000
+
+        heaviest = sorted(
+            self_times.items(), key=lambda item: item[1], reverse=True
+        )[:args.top]
+        print(f"{module}: {total_ms:.1f}ms")
+        for imported, micros in heaviest:
+            print(f"    {imported:<40} {micros / 1000:8.1f}ms")
+
+        heavy = find_heavy_imports(self_times)
+        if heavy:
+            print(f"    тяжелые зависимости: {', '.join(heavy)}")
+
+        if total_ms > args.budget_ms or heavy:
+            over_budget.append(module)
+
+    # ненулевой код возврата для проверки в CI
+    if over_budget:
+        print(
+            f"Превышен бюджет {args.budget_ms}ms или импортированы "
+            f"тяжелые зависимости: {', '.join(over_budget)}"
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
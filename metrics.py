@@ -0,0 +1,273 @@
+import logging
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock
+from time import perf_counter
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# границы корзин гистограмм, сек
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+    0.5, 1, 2.5, 5, 10, 30,
+)
+
+LabelValues = Tuple[str, ...]
+
+
+def escape_label_value(value: str) -> str:
+    """Функция экранирует значение метки по формату prometheus."""
+    return (
+        value.replace('\\', '\\\\')
+        .replace('"', '\\"')
+        .replace('\n', '\\n')
+    )
+
+
+def format_labels(
+    names: Tuple[str, ...], values: LabelValues,
+    extra: str = ''
+) -> str:
+    """Функция формирует метки в формате prometheus."""
+    pairs = [
+        f'{name}="{escape_label_value(str(value))}"'
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """Счетчик событий с метками."""
+    kind = 'counter'
+
+    def __init__(
+        self, name: str, help_text: str,
+        labels: Tuple[str, ...] = ()
+    ) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.values: Dict[LabelValues, float] = {}
+        self.lock = Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        """Метод увеличивает счетчик."""
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        """Метод выводит значения в формате prometheus."""
+        with self.lock:
+            return [
+                f'{self.name}{format_labels(self.labels, key)} {value}'
+                for key, value in self.values.items()
+            ]
+
+
+class Histogram:
+    """Гистограмма длительностей с метками."""
+    kind = 'histogram'
+
+    def __init__(
+        self, name: str, help_text: str,
+        labels: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        # ключ значения меток, значение: (корзины, сумма, количество)
+        self.values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+        self.lock = Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        """Метод добавляет наблюдение."""
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self.lock:
+            counts, total, count = self.values.get(
+                key, ([0] * len(self.buckets), 0.0, 0)
+            )
+            index = bisect_left(self.buckets, value)
+            if index < len(counts):
+                counts[index] += 1
+            self.values[key] = (counts, total + value, count + 1)
+
+    def render(self) -> List[str]:
+        """Метод выводит значения в формате prometheus."""
+        lines = []
+        with self.lock:
+            for key, (counts, total, count) in self.values.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    labels = format_labels(
+                        self.labels, key, f'le="{bound}"'
+                    )
+                    lines.append(f'{self.name}_bucket{labels} {cumulative}')
+                labels = format_labels(self.labels, key, 'le="+Inf"')
+                lines.append(f'{self.name}_bucket{labels} {count}')
+                labels = format_labels(self.labels, key)
+                lines.append(f'{self.name}_sum{labels} {total}')
+                lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    """Реестр метрик и переключаемое профилирование."""
+
+    def __init__(self) -> None:
+        self.metrics: Dict[str, object] = {}
+        self.profiler: Optional['cProfile.Profile'] = None
+        # при включенном профилировании логируются участки дольше порога
+        self.slow_threshold: Optional[float] = None
+
+    def counter(
+        self, name: str, help_text: str,
+        labels: Tuple[str, ...] = ()
+    ) -> Counter:
+        """Метод регистрирует счетчик."""
+        return self.metrics.setdefault(
+            name, Counter(name, help_text, labels)
+        )
+
+    def histogram(
+        self, name: str, help_text: str,
+        labels: Tuple[str, ...] = ()
+    ) -> Histogram:
+        """Метод регистрирует гистограмму."""
+        return self.metrics.setdefault(
+            name, Histogram(name, help_text, labels)
+        )
+
+    def render(self) -> str:
+        """Метод выводит все метрики в текстовом формате prometheus."""
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.help_text}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def start_profiling(self, slow_threshold: float = 0.5) -> None:
+        """Метод включает профилирование процесса."""
+        import cProfile
+
+        self.slow_threshold = slow_threshold
+        if self.profiler is None:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def stop_profiling(self, limit: int = 30) -> str:
+        """Метод выключает профилирование и возвращает статистику."""
+        import io
+        import pstats
+
+        self.slow_threshold = None
+        profiler, self.profiler = self.profiler, None
+        if profiler is None:
+            return ''
+        profiler.disable()
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream) \
+            .sort_stats('cumulative').print_stats(limit)
+        return stream.getvalue()
+
+
+# общий реестр процесса
+METRICS = MetricsRegistry()
+
+API_LATENCY = METRICS.histogram(
+    'api_request_seconds',
+    'Длительность запросов к api площадок', ('market', 'endpoint')
+)
+API_ERRORS = METRICS.counter(
+    'api_errors_total',
+    'Ответы api площадок с ошибочным статусом',
+    ('market', 'endpoint', 'status')
+)
+METHOD_LATENCY = METRICS.histogram(
+    'dialog_method_seconds',
+    'Длительность get_method_result', ('market', 'method')
+)
+SCRAPER_LATENCY = METRICS.histogram(
+    'cadastre_phase_seconds',
+    'Длительность этапов парсера кадастра', ('phase',)
+)
+REPORT_LATENCY = METRICS.histogram(
+    'report_phase_seconds',
+    'Длительность этапов отчетов', ('task', 'phase')
+)
+CACHE_HITS = METRICS.counter(
+    'cache_hits_total', 'Попадания в кэши и объединенные запросы', ('cache',)
+)
+PROXY_FAILURES = METRICS.counter(
+    'proxy_failures_total', 'Ошибки прокси парсера кадастра'
+)
+
+
+@contextmanager
+def timed(histogram: Histogram, **labels) -> Iterator[None]:
+    """Контекстный менеджер замера длительности участка."""
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        duration = perf_counter() - start
+        histogram.observe(duration, **labels)
+
+        threshold = METRICS.slow_threshold
+        if threshold is not None and duration >= threshold:
+            logger.warning(
+                f"Медленный участок {histogram.name} {labels}: "
+                f"{duration:.3f} сек"
+            )
+
+
+async def metrics_view(request):
+    """Выдача метрик для prometheus."""
+    from aiohttp import web
+
+    return web.Response(
+        text=METRICS.render(), content_type='text/plain', charset='utf-8'
+    )
+
+
+async def profile_start_view(request):
+    """Включение профилирования, порог в параметре threshold."""
+    from aiohttp import web
+
+    METRICS.start_profiling(float(request.query.get('threshold', 0.5)))
+    return web.Response(text='profiling started\n')
+
+
+async def profile_stop_view(request):
+    """Выключение профилирования и выдача статистики."""
+    from aiohttp import web
+
+    return web.Response(text=METRICS.stop_profiling())
+
+
+async def start_metrics_server(
+    host: str = '127.0.0.1', port: int = 9108
+) -> 'web.AppRunner':
+    """Функция запускает локальный сервер метрик."""
+    # сервер нужен не каждому процессу, aiohttp импортируется по запросу
+    from aiohttp import web
+
+    app = web.Application()
+    app.add_routes([
+        web.get('/metrics', metrics_view),
+        web.post('/profile/start', profile_start_view),
+        web.post('/profile/stop', profile_stop_view),
+    ])
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return runner
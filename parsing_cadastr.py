@@ -1,26 +1,47 @@
 import asyncio
-import aiohttp
+import logging
 import re
 import json
+from contextlib import contextmanager
 from random import choice, uniform
-from bs4 import BeautifulSoup
-from cloudscraper import create_scraper
-
-from aiogram.methods.send_message import SendMessage
-from tgbot.config.config import bot
 
 from interface.settings import (
     PROXY_LIST, PROXY_LOG, PROXY_PASS,
     DATA_T, DATA_S
 )
 
+from tgbot.windows.metrics import PROXY_FAILURES, SCRAPER_LATENCY, timed
+
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def count_proxy_failures():
+    """Контекстный менеджер подсчета ошибок прокси."""
+    try:
+        yield
+    except Exception as ex:
+        # requests уже импортирован к моменту запроса
+        from requests.exceptions import ProxyError
+
+        if isinstance(ex, ProxyError):
+            PROXY_FAILURES.inc()
+        raise
+
 
 class CadastreNumbers:
     url = "https://xn--80aaaaajm0cf1bvfgoh8r.xn--80asehdb/searchcad"
+    details_url = (
+        "https://xn--80aaaaajm0cf1bvfgoh8r.xn--80asehdb/searchcaddetails"
+    )
+    dadata_url = 'https://cleaner.dadata.ru/api/v1/clean/address'
     floor_pattern = r'Этаж: <b>\n\t\t\t\t\t\t(\d+) </b>\n\t'
     square_pattern = r'Площадь: <b>\n\t\t\t\t\t\t(\d+(,\d+)?)кв.м'
 
     ip_list = PROXY_LIST
+    # пауза после запроса к сайту, сек
+    request_delay = (5, 7)
 
     log = PROXY_LOG
     password = PROXY_PASS
@@ -40,7 +61,9 @@ class CadastreNumbers:
 
     async def clean_address(self):
         """Метод, производящий стандартизацию адреса по dadata."""
-        url = 'https://cleaner.dadata.ru/api/v1/clean/address'
+        import aiohttp
+
+        url = self.dadata_url
         headers = {
             'Content-Type': 'application/json',
             'Accept': 'application/json',
@@ -57,6 +80,9 @@ class CadastreNumbers:
 
     def get_proxy(self):
         """Метод, выбирающий случайный прокси."""
+        # без списка прокси запросы идут напрямую
+        if not self.ip_list:
+            return None
         random_element = choice(self.ip_list)
         proxy = {
             'http': f'http://{self.log}:{self.password}@{random_element}:8761',
@@ -66,16 +92,21 @@ class CadastreNumbers:
 
     def get_req_data(self, scraper):
         """Метод, получающий токен и кукисы."""
-        response = scraper.get(self.url, proxies=self.get_proxy())
-        cookies = response.cookies.get_dict()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        meta_tag = soup.find('meta', {'name': 'csrf-token'})
-        csrf_token = meta_tag['content']
+        from bs4 import BeautifulSoup
+
+        with timed(SCRAPER_LATENCY, phase='csrf'), count_proxy_failures():
+            response = scraper.get(self.url, proxies=self.get_proxy())
+            cookies = response.cookies.get_dict()
+            soup = BeautifulSoup(response.text, 'html.parser')
+            meta_tag = soup.find('meta', {'name': 'csrf-token'})
+            csrf_token = meta_tag['content']
 
         return csrf_token, cookies
 
     def get_data_numbers(self, session):
         """Метод, получающий информацию о всех номерах."""
+        from cloudscraper import create_scraper
+
         scraper = create_scraper(sess=session)
         csrf_token, cookies = self.get_req_data(scraper=scraper)
 
@@ -84,13 +115,17 @@ class CadastreNumbers:
             '_token': csrf_token,
         }
 
-        return scraper.post(
-            self.url, cookies=cookies, data=data,
-            proxies=self.get_proxy()
-        ).json()
+        with timed(SCRAPER_LATENCY, phase='numbers'), \
+                count_proxy_failures():
+            return scraper.post(
+                self.url, cookies=cookies, data=data,
+                proxies=self.get_proxy()
+            ).json()
 
     async def find_all_numbers(self):
         """Метод выводит все номера объекта."""
+        import aiohttp
+
         async with aiohttp.ClientSession() as session:
             html = await asyncio.to_thread(
                 self.get_data_numbers, session=session
@@ -110,6 +145,8 @@ class CadastreNumbers:
 
     def parse_object_info(self, session, number):
         """Метод, выводящий информацию по номеру объекта."""
+        from cloudscraper import create_scraper
+
         scraper = create_scraper(sess=session)
         csrf_token, cookies = self.get_req_data(scraper=scraper)
 
@@ -118,22 +155,21 @@ class CadastreNumbers:
             '_token': csrf_token,
         }
 
-        obj_info_url = (
-            "https://xn--80aaaaajm0cf1bvfgoh8r.xn--80asehdb/searchcaddetails"
-        )
-
-        response = scraper.post(
-            obj_info_url, cookies=cookies, data=data,
-            proxies=self.get_proxy()
-        ).json()
+        with timed(SCRAPER_LATENCY, phase='details'), \
+                count_proxy_failures():
+            response = scraper.post(
+                self.details_url, cookies=cookies, data=data,
+                proxies=self.get_proxy()
+            ).json()
 
         source = response.get('html', None)
         square = None
         floor = None
 
         if source:
-            square = self.parse_details(source, self.square_pattern)
-            floor = self.parse_details(source, self.floor_pattern)
+            with timed(SCRAPER_LATENCY, phase='parse'):
+                square = self.parse_details(source, self.square_pattern)
+                floor = self.parse_details(source, self.floor_pattern)
 
         return number, square, floor
 
@@ -143,15 +179,19 @@ class CadastreNumbers:
             result = await asyncio.to_thread(
                 self.parse_object_info, session=session, number=number
             )
-            delay = uniform(5, 7)
+            delay = uniform(*self.request_delay)
             await asyncio.sleep(delay)
             return result
 
     async def process_numbers(self):
         """Метод, обрабатывающий полученные кадастровые номера."""
+        import aiohttp
+
         # получение всех кадастровых номеров по адресу
         numbers = await self.find_all_numbers()
-        print(len(numbers))
+        logger.info(
+            f"По адресу {self.address} найдено {len(numbers)} номеров"
+        )
 
         # лимит в 10 запросов
         semaphore = asyncio.Semaphore(10)
@@ -179,11 +219,15 @@ class CadastreNumbers:
 
     async def send_result(self):
         """Метод, отправляющий результаты поиска номеров."""
+        # бот нужен только для отправки результата
+        from aiogram.methods.send_message import SendMessage
+        from tgbot.config.config import bot
+
         while True:
             # вызов функции process_numbers() в фоновом режиме
-            print('Task started')
+            logger.info(f"Поиск номеров по адресу {self.address} начат")
             result = await self.process_numbers()
-            print(f'{result}')
+            logger.info(f"Результат поиска по {self.address}: {result}")
             text = None
 
             if result:
@@ -1,21 +1,53 @@
+import asyncio
+import inspect
 import logging
-from typing import List, Dict, Any, Union, Tuple
-from datetime import datetime
-from mysql.connector import connect, Error
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from typing import (
+    List, Dict, Any, Union, Tuple,
+    Optional, Callable, Awaitable, TYPE_CHECKING
+)
 from interface.settings import (
     OFHOST, OFDATABASE, OFPASS, OFUSER
 )
 
-from actualising_report.models import (
-    ForPost, PrescriptionControl,
-    NoPhotos, OnlyMulti
+from tgbot.windows.metrics import REPORT_LATENCY, timed
+from .report_rows import ReportRow, build_row
+from .report_snapshots import (
+    invalidate_snapshot, save_snapshot,
+    ainvalidate_snapshot, asave_snapshot
 )
-from actualising_report.sql_tempates.templates import SQLTemplates
-from .add_to_db_class import AddToDb
+
+# модели, шаблоны запросов и драйвер БД импортируются при первом
+# запуске отчета, чтобы не замедлять старт процессов без отчетов
+if TYPE_CHECKING:
+    from actualising_report.models import (
+        ForPost, PrescriptionControl,
+        NoPhotos, OnlyMulti
+    )
 
 
 logger = logging.getLogger(__name__)
 
+# количество строк, сохраняемых за один переход в поток
+WRITE_CHUNK_SIZE = 200
+
+# отдельный поток записи отчетов: пачки AddToDb не занимают общий
+# поток sync_to_async, через который идут запросы окон бота
+REPORT_WRITER = ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix='report_writer'
+)
+
+# callback прогресса: (записано строк, всего строк)
+ProgressCallback = Callable[[int, int], Union[None, Awaitable[None]]]
+
+
+def close_connections() -> None:
+    """Функция закрывает соединения с БД текущего потока."""
+    from django.db import connections
+
+    connections.close_all()
+
 
 class Reports:
     """Класс для отработки отчетов актуализации."""
@@ -23,8 +55,8 @@ class Reports:
     def __init__(
         self, task: str,
         model_class: Union[
-            ForPost, PrescriptionControl,
-            NoPhotos, OnlyMulti
+            'ForPost', 'PrescriptionControl',
+            'NoPhotos', 'OnlyMulti'
         ],
         table_name: str, table_param: str,
         market: str = None
@@ -65,13 +97,36 @@ class Reports:
         # получение данных
         data = self.get_data()
 
+        # при ошибке запроса прошлый снимок остается в кэше
+        if data is None:
+            return
+
+        # снимок прошлого запуска больше не актуален
+        invalidate_snapshot(self.task, self.table_name, self.market)
+
+        with timed(REPORT_LATENCY, task=self.task, phase='write'):
+            self.write_rows(data)
+
+        # предрасчет агрегатов для окон бота
+        save_snapshot(self.task, self.table_name, data, self.market)
+
+    def get_adder_class(self) -> type:
+        """Метод получения класса добавления строк в модель."""
+        from .add_to_db_class import AddToDb
+
+        return AddToDb
+
+    def write_rows(self, rows: List[ReportRow]) -> None:
+        """Метод сохраняет строки отчета в модель."""
+        adder_class = self.get_adder_class()
+
         # создание экзепляра класса добавления в БД
-        for row in data:
-            adder = AddToDb(
+        for row in rows:
+            adder = adder_class(
                 model_class=self.model_class,
                 update_field='block_id',
                 update_offer_type='offer_type',
-                **row
+                **row._asdict()
             )
 
             # Вызов метода в зависимости от переданных данных
@@ -80,8 +135,9 @@ class Reports:
             else:
                 adder.add_to_db()
 
-    def get_data(self) -> List[Dict[str, Any]]:
-        """Метод получения обработанных данных."""
+    def get_sql_query(self) -> Optional[str]:
+        """Метод получения запроса к БД по шаблону задачи."""
+        from actualising_report.sql_tempates.templates import SQLTemplates
 
         # получение шаблона запроса к БД
         temp = SQLTemplates(
@@ -91,84 +147,159 @@ class Reports:
         # определение метода с нужным шаблоном
         sql_method = getattr(temp, self.task + '_temp', None)
         if sql_method:
-            sql_q = sql_method()
+            return sql_method()
+        # Обработка краевого случая
+        logger.error(
+            "Возникла ошибка при получении шаблона к базе данных!",
+            exc_info=True
+        )
+
+    def get_data(self) -> Optional[List[ReportRow]]:
+        """Метод получения обработанных данных."""
+        sql_q = self.get_sql_query()
+        if sql_q:
             # обработка данных
             return self.make_request(sql_q)
-        # Обработка краевого случая
-        else:
-            logger.error(
-                "Возникла ошибка при получении шаблона к базе данных!",
-                exc_info=True
-            )
 
-    def make_request(self, sql_q) -> List[Dict[str, Any]]:
+    def build_rows(self, rows: Tuple[Any]) -> List[ReportRow]:
+        """Метод формирует строки отчета из выборки БД."""
+        with timed(REPORT_LATENCY, task=self.task, phase='transform'):
+            # компактные строки отчета вместо словарей
+            return [
+                build_row(
+                    self.task, row, self.offer_key,
+                    self.offer_type, self.market
+                )
+                for row in rows
+            ]
+
+    def get_connection(self) -> Any:
+        """Метод открывает соединение с БД объявлений."""
+        from mysql.connector import connect
+
+        return connect(
+            host=OFHOST,
+            database=OFDATABASE,
+            user=OFUSER,
+            password=OFPASS,
+        )
+
+    def make_request(self, sql_q) -> Optional[List[ReportRow]]:
         """Метод выполняющий запрос к БД и обрабатывающий данные."""
+        from mysql.connector import Error
+
         try:
-            with connect(
-                host=OFHOST,
-                database=OFDATABASE,
-                user=OFUSER,
-                password=OFPASS,
-            ) as connection:
+            with self.get_connection() as connection:
                 with connection.cursor(buffered=True) as cursor:
-                    cursor.execute(sql_q)
-
-                    rows: Tuple[Any] = cursor.fetchall()
-
-                    # базовый шаблон возвращаемых данных
-                    base_dicts = [{'block_id': row[0],
-                                   'building_id': row[1],
-                                   'address': row[2],
-                                   'area_max': row[3],
-                                   'rate': row[4],
-                                   'price': (
-                                       int(row[3] * row[4] / 12)
-                                       if self.offer_key == "rent"
-                                       else int(row[3] * row[4])
-                                   ),
-                                   'offer_type': self.offer_type}
-                                  for row in rows]
-
-                    # пополнение базового шаблона в зависимости
-                    # от выполняемой задачи
-                    if self.task == "prescription":
-                        for i, base_dict in enumerate(base_dicts):
-                            base_dict['resp_id'] = rows[i][5]
-                            base_dict['resp_name'] = rows[i][6]
-                            base_dict['owner_id'] = False \
-                                if rows[i][7] == 35 else (
-                                True if rows[i][7] is not None else False
-                            )
-                            base_dict['updated_at'] = rows[i][8]
-                            time_difference = datetime.now() - rows[i][8]
-                            base_dict['days_from_actualisation'] = (
-                                time_difference.days
-                            )
-                            base_dict['outdated'] = time_difference.days < 30
-
-                    if self.task in ["for_post", "for_post_not_active"]:
-                        for base_dict in base_dicts:
-                            base_dict['market'] = self.market
-
-                    if self.task in ["no_photo", "only_multi"]:
-                        for i, base_dict in enumerate(base_dicts):
-                            floor = rows[i][5]
-                            if floor.isdigit():
-                                base_dict['floor'] = int(floor)
-                            else:
-                                base_dict['floor'] = 0
-                            base_dict['block_type'] = rows[i][6]
-                            if self.task == "no_photo":
-                                base_dict['is_full_building'] = True \
-                                    if rows[i][7] == 1 else False
-
-                    if self.task == "only_active":
-                        for i, base_dict in enumerate(base_dicts):
-                            base_dict['is_available_block'] = rows[i][-3]
-                            base_dict['is_export_building'] = rows[i][-2]
-                            base_dict['is_export_block'] = rows[i][-1]
-
-                    return base_dicts
+                    with timed(
+                        REPORT_LATENCY, task=self.task, phase='query'
+                    ):
+                        cursor.execute(sql_q)
+
+                        rows: Tuple[Any] = cursor.fetchall()
+
+                    return self.build_rows(rows)
+
+        except Error as ex:
+            logger.error(f"Возникла ошибка {ex} запросе к БД!")
+
+    async def aadd_to_db(
+        self, on_progress: Optional[ProgressCallback] = None
+    ) -> Optional[int]:
+        """Асинхронный метод добавления объектов в базу данных."""
+        # получение данных
+        data = await self.aget_data()
+
+        # при ошибке запроса прошлый снимок остается в кэше
+        if data is None:
+            await self.notify_progress(on_progress, 0, 0)
+            return None
+
+        # снимок прошлого запуска больше не актуален
+        await ainvalidate_snapshot(self.task, self.table_name, self.market)
+
+        total = len(data)
+        loop = asyncio.get_running_loop()
+        # этап записи замеряется за весь запуск, как и в синхронном
+        # add_to_db, без времени callback прогресса
+        write_time = 0.0
+
+        # запись пачками в потоке записи отчетов, отмена задачи
+        # прерывает запись между пачками
+        try:
+            for start in range(0, total, WRITE_CHUNK_SIZE):
+                chunk_start = perf_counter()
+                await loop.run_in_executor(
+                    REPORT_WRITER, self.write_rows,
+                    data[start:start + WRITE_CHUNK_SIZE]
+                )
+                write_time += perf_counter() - chunk_start
+
+                # сообщаем о прогрессе (записано, всего)
+                await self.notify_progress(
+                    on_progress,
+                    min(start + WRITE_CHUNK_SIZE, total), total
+                )
+        finally:
+            # поток записи закрывает свои соединения с БД после запуска
+            await loop.run_in_executor(REPORT_WRITER, close_connections)
+            REPORT_LATENCY.observe(write_time, task=self.task, phase='write')
+
+        # пустой отчет тоже сообщает о завершении
+        if not total:
+            await self.notify_progress(on_progress, 0, 0)
+
+        # предрасчет агрегатов для окон бота
+        await asave_snapshot(self.task, self.table_name, data, self.market)
+
+        return total
+
+    @staticmethod
+    async def notify_progress(
+        on_progress: Optional[ProgressCallback],
+        done: int, total: int
+    ) -> None:
+        """Метод вызывает callback прогресса, если он передан."""
+        if on_progress:
+            progress = on_progress(done, total)
+            if inspect.isawaitable(progress):
+                await progress
+
+    async def aget_data(self) -> Optional[List[ReportRow]]:
+        """Асинхронный метод получения обработанных данных."""
+        sql_q = self.get_sql_query()
+        if sql_q:
+            # обработка данных
+            return await self.amake_request(sql_q)
+
+    async def aget_connection(self) -> Any:
+        """Асинхронный метод открывает соединение с БД объявлений."""
+        from mysql.connector.aio import connect as aconnect
+
+        return await aconnect(
+            host=OFHOST,
+            database=OFDATABASE,
+            user=OFUSER,
+            password=OFPASS,
+        )
+
+    async def amake_request(self, sql_q) -> Optional[List[ReportRow]]:
+        """Асинхронный запрос к БД объявлений."""
+        from mysql.connector import Error
+
+        try:
+            async with await self.aget_connection() as connection:
+                async with await connection.cursor(buffered=True) as cursor:
+                    with timed(
+                        REPORT_LATENCY, task=self.task, phase='query'
+                    ):
+                        await cursor.execute(sql_q)
+
+                        rows: Tuple[Any] = await cursor.fetchall()
 
         except Error as ex:
             logger.error(f"Возникла ошибка {ex} запросе к БД!")
+            return None
+
+        # преобразование больших выборок не блокирует цикл событий
+        return await asyncio.to_thread(self.build_rows, rows)
@@ -0,0 +1,144 @@
+from datetime import datetime
+from typing import Any, NamedTuple, Optional, Sequence, Union
+
+
+class BaseRow(NamedTuple):
+    """Базовая строка отчета актуализации."""
+    block_id: int
+    building_id: int
+    address: str
+    area_max: float
+    rate: float
+    price: int
+    offer_type: str
+
+
+class PrescriptionRow(NamedTuple):
+    """Строка отчета по давности актуализации."""
+    block_id: int
+    building_id: int
+    address: str
+    area_max: float
+    rate: float
+    price: int
+    offer_type: str
+    resp_id: int
+    resp_name: str
+    owner_id: bool
+    updated_at: datetime
+    days_from_actualisation: int
+    outdated: bool
+
+
+class ForPostRow(NamedTuple):
+    """Строка отчета по блокам для публикации."""
+    block_id: int
+    building_id: int
+    address: str
+    area_max: float
+    rate: float
+    price: int
+    offer_type: str
+    market: Optional[str]
+
+
+class OnlyMultiRow(NamedTuple):
+    """Строка отчета по блокам только с мультиобъявлением."""
+    block_id: int
+    building_id: int
+    address: str
+    area_max: float
+    rate: float
+    price: int
+    offer_type: str
+    floor: int
+    block_type: str
+
+
+class NoPhotoRow(NamedTuple):
+    """Строка отчета по блокам без фотографий."""
+    block_id: int
+    building_id: int
+    address: str
+    area_max: float
+    rate: float
+    price: int
+    offer_type: str
+    floor: int
+    block_type: str
+    is_full_building: bool
+
+
+class OnlyActiveRow(NamedTuple):
+    """Строка отчета по активным блокам."""
+    block_id: int
+    building_id: int
+    address: str
+    area_max: float
+    rate: float
+    price: int
+    offer_type: str
+    is_available_block: Any
+    is_export_building: Any
+    is_export_block: Any
+
+
+ReportRow = Union[
+    BaseRow, PrescriptionRow, ForPostRow,
+    OnlyMultiRow, NoPhotoRow, OnlyActiveRow
+]
+
+
+def build_row(
+    task: str, row: Sequence[Any],
+    offer_key: str, offer_type: str,
+    market: Optional[str] = None
+) -> ReportRow:
+    """Функция формирует строку отчета из строки выборки БД."""
+    # базовый шаблон возвращаемых данных
+    base = (
+        row[0], row[1], row[2], row[3], row[4],
+        (
+            int(row[3] * row[4] / 12)
+            if offer_key == "rent"
+            else int(row[3] * row[4])
+        ),
+        offer_type,
+    )
+
+    # пополнение базового шаблона в зависимости
+    # от выполняемой задачи
+    if task == "prescription":
+        time_difference = datetime.now() - row[8]
+        return PrescriptionRow(
+            *base,
+            resp_id=row[5],
+            resp_name=row[6],
+            owner_id=False if row[7] == 35 else row[7] is not None,
+            updated_at=row[8],
+            days_from_actualisation=time_difference.days,
+            outdated=time_difference.days < 30,
+        )
+
+    if task in ["for_post", "for_post_not_active"]:
+        return ForPostRow(*base, market=market)
+
+    if task in ["no_photo", "only_multi"]:
+        floor = row[5]
+        floor = int(floor) if floor.isdigit() else 0
+        if task == "no_photo":
+            return NoPhotoRow(
+                *base, floor=floor, block_type=row[6],
+                is_full_building=row[7] == 1,
+            )
+        return OnlyMultiRow(*base, floor=floor, block_type=row[6])
+
+    if task == "only_active":
+        return OnlyActiveRow(
+            *base,
+            is_available_block=row[-3],
+            is_export_building=row[-2],
+            is_export_block=row[-1],
+        )
+
+    return BaseRow(*base)
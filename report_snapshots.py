@@ -0,0 +1,144 @@
+import asyncio
+import html
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from django.core.cache import cache
+
+from tgbot.windows.metrics import CACHE_HITS
+from .report_rows import ReportRow
+
+
+# шаблон ключа кэша для снимка отчета
+SNAPSHOT_KEY = "report_snapshot:{task}:{table_name}:{market}"
+# блок считается устаревшим, если не актуализировался столько дней
+OUTDATED_DAYS = 30
+
+
+def snapshot_key(
+    task: str, table_name: str,
+    market: Optional[str] = None
+) -> str:
+    """Функция формирует ключ кэша снимка отчета."""
+    return SNAPSHOT_KEY.format(
+        task=task, table_name=table_name, market=market or "all"
+    )
+
+
+def build_snapshot(
+    task: str, rows: List[ReportRow],
+    market: Optional[str] = None
+) -> Dict[str, Any]:
+    """Функция считает агрегаты отчета по рынку и ответственным."""
+    by_market: Counter = Counter()
+    by_resp: Dict[Any, Dict[str, Any]] = {}
+
+    for row in rows:
+        by_market[getattr(row, "market", None) or market or "all"] += 1
+
+        # агрегаты по ответственным есть только у prescription
+        resp_id = getattr(row, "resp_id", None)
+        if resp_id is None:
+            continue
+        resp = by_resp.setdefault(resp_id, {
+            "resp_name": row.resp_name,
+            "total": 0,
+            "outdated": 0,
+        })
+        resp["total"] += 1
+        resp["outdated"] += int(
+            row.days_from_actualisation >= OUTDATED_DAYS
+        )
+
+    snapshot = {
+        "task": task,
+        "market": market,
+        "created_at": datetime.now(),
+        "total": len(rows),
+        "by_market": dict(by_market),
+        "by_resp": by_resp,
+    }
+    snapshot["summary"] = format_summary(snapshot)
+
+    return snapshot
+
+
+def format_summary(snapshot: Dict[str, Any]) -> str:
+    """Функция формирует текст снимка для окна в телеге."""
+    lines = [
+        f"<b>Отчет {html.escape(snapshot['task'])}</b>",
+        f"<i>от {snapshot['created_at']:%d.%m.%Y %H:%M}</i>",
+        f"Всего блоков: <b>{snapshot['total']}</b>",
+    ]
+
+    for market, count in snapshot["by_market"].items():
+        lines.append(f"{html.escape(str(market))}: {count}")
+
+    for resp in snapshot["by_resp"].values():
+        lines.append(
+            f"{html.escape(str(resp['resp_name']))}: устаревших "
+            f"(от {OUTDATED_DAYS} дней) {resp['outdated']} "
+            f"из {resp['total']}"
+        )
+
+    return '\n'.join(lines)
+
+
+def invalidate_snapshot(
+    task: str, table_name: str,
+    market: Optional[str] = None
+) -> None:
+    """Функция удаляет устаревший снимок отчета."""
+    cache.delete(snapshot_key(task, table_name, market))
+
+
+def save_snapshot(
+    task: str, table_name: str, rows: List[ReportRow],
+    market: Optional[str] = None
+) -> Dict[str, Any]:
+    """Функция сохраняет снимок отчета до следующего запуска."""
+    snapshot = build_snapshot(task, rows, market)
+    cache.set(snapshot_key(task, table_name, market), snapshot, None)
+    return snapshot
+
+
+def get_snapshot(
+    task: str, table_name: str,
+    market: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """Функция получает снимок отчета из кэша."""
+    snapshot = cache.get(snapshot_key(task, table_name, market))
+    if snapshot is not None:
+        CACHE_HITS.inc(cache='report_snapshot')
+    return snapshot
+
+
+async def ainvalidate_snapshot(
+    task: str, table_name: str,
+    market: Optional[str] = None
+) -> None:
+    """Асинхронное удаление устаревшего снимка отчета."""
+    await cache.adelete(snapshot_key(task, table_name, market))
+
+
+async def asave_snapshot(
+    task: str, table_name: str, rows: List[ReportRow],
+    market: Optional[str] = None
+) -> Dict[str, Any]:
+    """Асинхронное сохранение снимка отчета."""
+    # агрегаты большого отчета считаются вне цикла событий
+    snapshot = await asyncio.to_thread(build_snapshot, task, rows, market)
+    await cache.aset(snapshot_key(task, table_name, market), snapshot, None)
+    return snapshot
+
+
+async def aget_snapshot(
+    task: str, table_name: str,
+    market: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """Асинхронное получение снимка отчета из кэша."""
+    snapshot = await cache.aget(snapshot_key(task, table_name, market))
+    if snapshot is not None:
+        CACHE_HITS.inc(cache='report_snapshot')
+    return snapshot
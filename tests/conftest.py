@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+
+# модули репозитория лежат в корне, без пакета
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
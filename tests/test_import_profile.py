@@ -0,0 +1,32 @@
+import pytest
+
+from import_profile import (
+    HEAVY_MODULES, PROFILED_MODULES,
+    find_heavy_imports, profile_import
+)
+
+
+@pytest.mark.parametrize("module", PROFILED_MODULES)
+def test_heavy_modules_are_not_imported(module):
+    """Тяжелые зависимости не импортируются вместе с модулем."""
+    # модули профилируются в пакетах проекта с настройками django
+    pytest.importorskip("interface.settings")
+    pytest.importorskip(module.split('.')[0])
+
+    _, self_times = profile_import(module)
+
+    assert module in self_times
+    assert find_heavy_imports(self_times) == []
+
+
+def test_find_heavy_imports_matches_submodules():
+    """Подмодули тяжелых зависимостей тоже находятся."""
+    self_times = {
+        "bs4.element": 1, "bs4": 2, "mysqlx": 3,
+        "tgbot.windows.avito_api_methods": 4, "json": 5,
+    }
+
+    assert "mysql" in HEAVY_MODULES
+    assert find_heavy_imports(self_times) == [
+        "bs4", "bs4.element", "tgbot.windows.avito_api_methods"
+    ]
@@ -0,0 +1,11 @@
+from metrics import Counter
+
+
+def test_label_values_are_escaped():
+    """Кавычки, обратный слэш и перевод строки экранируются в метках."""
+    counter = Counter('errors_total', 'Ошибки', ('endpoint',))
+    counter.inc(endpoint='a"b\\c\nd')
+
+    assert counter.render() == [
+        'errors_total{endpoint="a\\"b\\\\c\\nd"} 1'
+    ]
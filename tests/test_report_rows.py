@@ -0,0 +1,59 @@
+import tracemalloc
+from datetime import datetime, timedelta
+
+from report_rows import PrescriptionRow, build_row
+
+
+ROWS_COUNT = 20000
+
+
+def make_rows(count):
+    """Строки выборки prescription с разной давностью актуализации."""
+    now = datetime.now()
+    return [
+        (
+            i, i // 10, f'Москва, улица {i // 10}', 120.5, 30000.0,
+            i % 25, f'Сотрудник {i % 25}', None,
+            now - timedelta(days=i % 120),
+        )
+        for i in range(count)
+    ]
+
+
+def traced_peak(factory):
+    """Пиковая память, выделенная при вызове factory."""
+    tracemalloc.start()
+    try:
+        result = factory()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    del result
+    return peak
+
+
+def test_prescription_row_fields():
+    row = build_row(
+        "prescription", make_rows(1)[0], "rent", "Аренда"
+    )
+
+    assert isinstance(row, PrescriptionRow)
+    assert row.price == int(120.5 * 30000.0 / 12)
+    assert row.owner_id is False
+    assert row.days_from_actualisation == 0
+    assert row.outdated is True
+
+
+def test_rows_use_less_memory_than_dicts():
+    rows = make_rows(ROWS_COUNT)
+
+    rows_peak = traced_peak(lambda: [
+        build_row("prescription", row, "rent", "Аренда")
+        for row in rows
+    ])
+    dicts_peak = traced_peak(lambda: [
+        build_row("prescription", row, "rent", "Аренда")._asdict()
+        for row in rows
+    ])
+
+    assert rows_peak < dicts_peak * 0.6